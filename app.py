@@ -1,29 +1,14 @@
 import gradio as gr
-import os
-import tempfile
-from infer import infer  # your existing function
-import cv2
+from infer import load_model_and_dataset, infer_one_image
 from types import SimpleNamespace
 
-def run_inference(image):
-    # Save uploaded image to temp file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-        image_path = tmp.name
-        cv2.imwrite(image_path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
-
-    
-    args = SimpleNamespace(config_path='config.yaml', evaluate=False, infer_samples=True, path=image_path)
-    output_path=infer(args)
-    print(output_path)
+# Load model and dataset once, not on every request
+faster_rcnn_model, voc, _ = load_model_and_dataset(SimpleNamespace(config_path='config.yaml'),
+                                                   image_inference=True)
 
-    # Load result image (assume saved to same filename in 'outputs/')
-    
-    if os.path.exists(output_path):
-        result = cv2.imread(output_path)
-        result = cv2.cvtColor(result, cv2.COLOR_BGR2RGB)
-        return result
-    else:
-        return "Error: Output image not found."
+def run_inference(image):
+    # Uploaded image is RGB, result is returned in the same channel order
+    return infer_one_image(faster_rcnn_model, voc, image, rgb=True)
 
 # Gradio UI
 iface = gr.Interface(
@@ -2,24 +2,60 @@ import torch
 from torch.utils.data import Dataset
 from PIL import Image
 import os
+import warnings
+import numpy as np
 import torchvision.transforms as T
+from torchvision.io import read_file, decode_image, ImageReadMode
+
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png'})
+
+
+def load_annotation(annotation_path):
+    """
+    Reads a per-image annotation file with one `x1 y1 x2 y2 class_id` row per box.
+    Returns a float32 array of shape (N, 5), empty (0, 5) if the file is missing or empty.
+    """
+    try:
+        with warnings.catch_warnings():
+            # loadtxt warns on empty files
+            warnings.simplefilter('ignore', UserWarning)
+            arr = np.loadtxt(annotation_path, dtype=np.float32, ndmin=2)
+    except OSError:
+        return np.zeros((0, 5), dtype=np.float32)
+    except ValueError:
+        # Rows with a different number of columns, keep only the valid ones
+        with open(annotation_path, 'r') as f:
+            rows = [parts for parts in (line.split() for line in f) if len(parts) == 5]
+        return np.array(rows, dtype=np.float32).reshape(-1, 5)
+    if arr.shape[1] != 5:
+        return np.zeros((0, 5), dtype=np.float32)
+    return arr
 
 class PerImageAnnotationDataset(Dataset):
-    def __init__(self, image_dir, annotation_dir, transform=None, annotation_ext=".txt"):
+    def __init__(self, image_dir, annotation_dir, transform=None, annotation_ext=".txt", uint8_images=False):
         """
         Args:
             image_dir (str): Path to image files.
             annotation_dir (str): Path to per-image annotation files.
             transform (callable, optional): Image transforms (should include ToTensor()).
             annotation_ext (str): Annotation file extension (e.g., ".txt").
+            uint8_images (bool): If True images are decoded straight to a uint8 tensor [C, H, W]
+                and scaling to [0, 1] is left to the caller (so that it can happen on the gpu).
+                transform is not applied in this case.
         """
         self.image_dir = image_dir
         self.annotation_dir = annotation_dir
         self.transform = transform or T.ToTensor()
+        self.uint8_images = uint8_images
         self.annotation_ext = annotation_ext
 
-        self.image_filenames = [f for f in os.listdir(image_dir)
-                                if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+        with os.scandir(image_dir) as entries:
+            self.image_filenames = [e.name for e in entries
+                                    if os.path.splitext(e.name)[1].lower() in IMAGE_EXTENSIONS]
+        # Full paths are joined once here instead of on every __getitem__
+        self.image_paths = [os.path.join(image_dir, f) for f in self.image_filenames]
+        self.annotation_paths = [os.path.join(annotation_dir, os.path.splitext(f)[0] + annotation_ext)
+                                 for f in self.image_filenames]
     idx2label = {
       
         0:'Portable_Charger_1',
@@ -36,30 +72,37 @@ class PerImageAnnotationDataset(Dataset):
 
     def __getitem__(self, idx):
         image_name = self.image_filenames[idx]
-        image_path = os.path.join(self.image_dir, image_name)
-        annotation_name = os.path.splitext(image_name)[0] + self.annotation_ext
-        annotation_path = os.path.join(self.annotation_dir, annotation_name)
+        image_path = self.image_paths[idx]
+        annotation_path = self.annotation_paths[idx]
 
         # Load and transform image
-        image = Image.open(image_path).convert("RGB")
-        image = self.transform(image)  # Returns a torch.FloatTensor: [C, H, W]
+        if self.uint8_images:
+            # libjpeg-turbo backed decode, returns a torch.ByteTensor: [C, H, W]
+            image = decode_image(read_file(image_path), mode=ImageReadMode.RGB)
+        else:
+            image = Image.open(image_path).convert("RGB")
+            image = self.transform(image)  # Returns a torch.FloatTensor: [C, H, W]
 
         # Load bounding boxes and class labels
-        boxes = []
-        labels = []
-        with open(annotation_path, 'r') as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) != 5:
-                    continue  # skip invalid lines
-                x1, y1, x2, y2, class_id = map(float, parts)
-                boxes.append([x1, y1, x2, y2])
-                labels.append(int(class_id))
+        annotation = load_annotation(annotation_path)
+        # Boxes as one contiguous (N, 4) float32 block, labels as a separate (N,) int64 array
+        boxes = torch.from_numpy(np.ascontiguousarray(annotation[:, :4]))
+        labels = torch.from_numpy(annotation[:, 4].astype(np.int64))
 
         target = {
-            'bboxes': torch.tensor(boxes, dtype=torch.float32),
-            'labels': torch.tensor(labels, dtype=torch.int64),
+            'bboxes': boxes,
+            'labels': labels,
             'image_id': torch.tensor([idx])
         }
 
         return image, target, image_name  # Return image, target, and image name
+
+
+def collate_fn(batch):
+    """
+    Images in a batch can have different sizes and a different number of boxes,
+    so instead of stacking keep them as lists.
+    Returns (list of images, list of targets, list of image names)
+    """
+    images, targets, image_names = zip(*batch)
+    return list(images), list(targets), list(image_names)
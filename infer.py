@@ -5,34 +5,59 @@ import argparse
 import random
 import os
 import yaml
+from collections import defaultdict
+from functools import lru_cache
 from tqdm import tqdm
-from model import FasterRCNN
-from custom_dataset import PerImageAnnotationDataset
+from model import FasterRCNN, CUDAGraphModule
+from custom_dataset import PerImageAnnotationDataset, collate_fn
+from torch.utils.data import Subset
 from torch.utils.data.dataloader import DataLoader
 
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+# Output jpegs are only for viewing, quality 85 encodes faster and smaller than the default 95
+jpeg_write_params = [cv2.IMWRITE_JPEG_QUALITY, 85, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
 
 
-def get_iou(det, gt):
-    det_x1, det_y1, det_x2, det_y2 = det
-    gt_x1, gt_y1, gt_x2, gt_y2 = gt
+def get_iou_matrix(dets, gts):
+    r"""
+    IOU between two sets of boxes using numpy broadcasting
+    :param dets: (ndarray of shape N x 4)
+    :param gts: (ndarray of shape K x 4)
+    :return: IOU matrix of shape N x K
+    """
+    # Get top left x1,y1 coordinate
+    x_left = np.maximum(dets[:, None, 0], gts[None, :, 0])  # (N, K)
+    y_top = np.maximum(dets[:, None, 1], gts[None, :, 1])  # (N, K)
     
-    x_left = max(det_x1, gt_x1)
-    y_top = max(det_y1, gt_y1)
-    x_right = min(det_x2, gt_x2)
-    y_bottom = min(det_y2, gt_y2)
+    # Get bottom right x2,y2 coordinate
+    x_right = np.minimum(dets[:, None, 2], gts[None, :, 2])  # (N, K)
+    y_bottom = np.minimum(dets[:, None, 3], gts[None, :, 3])  # (N, K)
     
-    if x_right < x_left or y_bottom < y_top:
-        return 0.0
-    
-    area_intersection = (x_right - x_left) * (y_bottom - y_top)
-    det_area = (det_x2 - det_x1) * (det_y2 - det_y1)
-    gt_area = (gt_x2 - gt_x1) * (gt_y2 - gt_y1)
-    area_union = float(det_area + gt_area - area_intersection + 1E-6)
+    area_intersection = np.clip(x_right - x_left, 0, None) * np.clip(y_bottom - y_top, 0, None)  # (N, K)
+    det_area = (dets[:, 2] - dets[:, 0]) * (dets[:, 3] - dets[:, 1])  # (N,)
+    gt_area = (gts[:, 2] - gts[:, 0]) * (gts[:, 3] - gts[:, 1])  # (K,)
+    area_union = det_area[:, None] + gt_area[None, :] - area_intersection + 1E-6  # (N, K)
     iou = area_intersection / area_union
     return iou
 
 
+def get_box_polylines(boxes):
+    r"""
+    Corner points of boxes so that all box outlines
+    can be drawn with a single cv2.polylines call
+    :param boxes: (ndarray of shape N x 4) x1, y1, x2, y2 boxes
+    :return: (ndarray of shape N x 4 x 2) int32 corner points
+    """
+    return boxes[:, [0, 1, 2, 1, 2, 3, 0, 3]].reshape(-1, 4, 2).astype(np.int32)
+
+
+@lru_cache(maxsize=1024)
+def get_text_size(text):
+    # Label texts repeat a lot across boxes, so cache their sizes
+    text_size, _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_PLAIN, 1, 1)
+    return text_size
+
+
 def compute_map(det_boxes, gt_boxes, iou_threshold=0.5, method='area'):
     # det_boxes = [
     #   {
@@ -79,33 +104,39 @@ def compute_map(det_boxes, gt_boxes, iou_threshold=0.5, method='area'):
         # Sort them by confidence score
         cls_dets = sorted(cls_dets, key=lambda k: -k[1][-1])
         
-        # For tracking which gt boxes of this class have already been matched
-        gt_matched = [[False for _ in im_gts[label]] for im_gts in gt_boxes]
         # Number of gt boxes for this class for recall calculation
         num_gts = sum([len(im_gts[label]) for im_gts in gt_boxes])
-        tp = [0] * len(cls_dets)
-        fp = [0] * len(cls_dets)
+        tp = np.zeros(len(cls_dets))
+        fp = np.zeros(len(cls_dets))
         
-        # For each prediction
+        # Group the sorted predictions by image, indices stay in score order
+        dets_by_img = defaultdict(list)
         for det_idx, (im_idx, det_pred) in enumerate(cls_dets):
+            dets_by_img[im_idx].append(det_idx)
+        
+        # Match all predictions of one image at once
+        for im_idx, det_idxs in dets_by_img.items():
+            det_idxs = np.array(det_idxs)
             # Get gt boxes for this image and this label
-            im_gts = gt_boxes[im_idx][label]
-            max_iou_found = -1
-            max_iou_gt_idx = -1
+            im_gts = np.array(gt_boxes[im_idx][label], dtype=np.float64).reshape(-1, 4)
+            if im_gts.shape[0] == 0:
+                fp[det_idxs] = 1
+                continue
             
-            # Get best matching gt box
-            for gt_box_idx, gt_box in enumerate(im_gts):
-                gt_box_iou = get_iou(det_pred[:-1], gt_box)
-                if gt_box_iou > max_iou_found:
-                    max_iou_found = gt_box_iou
-                    max_iou_gt_idx = gt_box_idx
-            # TP only if iou >= threshold and this gt has not yet been matched
-            if max_iou_found < iou_threshold or gt_matched[im_idx][max_iou_gt_idx]:
-                fp[det_idx] = 1
-            else:
-                tp[det_idx] = 1
-                # If tp then we set this gt box as matched
-                gt_matched[im_idx][max_iou_gt_idx] = True
+            # Get best matching gt box for every prediction
+            im_dets = np.array([cls_dets[det_idx][1][:-1] for det_idx in det_idxs], dtype=np.float64)
+            iou_matrix = get_iou_matrix(im_dets, im_gts)
+            max_iou_found = iou_matrix.max(axis=1)
+            max_iou_gt_idx = iou_matrix.argmax(axis=1)
+            
+            # TP only if iou >= threshold and this gt has not yet been matched,
+            # i.e. it is the highest scoring prediction above threshold for its best gt
+            above_threshold = np.where(max_iou_found >= iou_threshold)[0]
+            _, first_match = np.unique(max_iou_gt_idx[above_threshold], return_index=True)
+            is_tp = np.zeros(len(det_idxs), dtype=bool)
+            is_tp[above_threshold[first_match]] = True
+            tp[det_idxs[is_tp]] = 1
+            fp[det_idxs[~is_tp]] = 1
         # Cumulative tp and fp
         tp = np.cumsum(tp)
         fp = np.cumsum(fp)
@@ -128,15 +159,19 @@ def compute_map(det_boxes, gt_boxes, iou_threshold=0.5, method='area'):
             # Add the rectangular areas to get ap
             ap = np.sum((recalls[i + 1] - recalls[i]) * precisions[i + 1])
         elif method == 'interp':
-            ap = 0.0
-            for interp_pt in np.arange(0, 1 + 1E-3, 0.1):
-                # Get precision values for recall values >= interp_pt
-                prec_interp_pt = precisions[recalls >= interp_pt]
-                
-                # Get max of those precision values
-                prec_interp_pt = prec_interp_pt.max() if prec_interp_pt.size > 0.0 else 0.0
-                ap += prec_interp_pt
-            ap = ap / 11.0
+            interp_pts = np.arange(0, 1 + 1E-3, 0.1)
+            if precisions.size == 0:
+                ap = 0.0
+            else:
+                # Max precision over all recall values >= r, for every index
+                prec_envelope = np.maximum.accumulate(precisions[::-1])[::-1]
+                # Recalls are non decreasing so first index with recall >= interp_pt
+                # can be found with a binary search for all points at once
+                interp_idxs = np.searchsorted(recalls, interp_pts, side='left')
+                prec_interp_pts = np.where(interp_idxs < prec_envelope.size,
+                                           prec_envelope[np.clip(interp_idxs, 0, prec_envelope.size - 1)],
+                                           0.0)
+                ap = prec_interp_pts.sum() / 11.0
         else:
             raise ValueError('Method can only be area or interp')
         if num_gts > 0:
@@ -149,7 +184,7 @@ def compute_map(det_boxes, gt_boxes, iou_threshold=0.5, method='area'):
     return mean_ap, all_aps
 
 
-def load_model_and_dataset(args):
+def load_model_and_dataset(args, image_inference=False):
     # Read the config file #
     with open(args.config_path, 'r') as file:
         try:
@@ -174,28 +209,95 @@ def load_model_and_dataset(args):
 
 
 
-    voc = PerImageAnnotationDataset(image_dir=dataset_config['im_test_path'], annotation_dir=dataset_config['ann_test_path'])
-    test_dataset = DataLoader(voc, batch_size=1, shuffle=False)
+    voc = PerImageAnnotationDataset(image_dir=dataset_config['im_test_path'], annotation_dir=dataset_config['ann_test_path'],
+                                    uint8_images=True)
+    # Decode images in worker processes and pin them for async copies to gpu
+    num_workers = (os.cpu_count() or 0) // 2
+    test_dataset = DataLoader(voc, batch_size=8, shuffle=False, collate_fn=collate_fn,
+                              num_workers=num_workers,
+                              pin_memory=device.type == 'cuda',
+                              persistent_workers=num_workers > 0,
+                              prefetch_factor=2 if num_workers > 0 else None)
     
     faster_rcnn_model = FasterRCNN(model_config, num_classes=dataset_config['num_classes'])
     faster_rcnn_model.eval()
+    faster_rcnn_model.requires_grad_(False)
     faster_rcnn_model.to(device)
     faster_rcnn_model.load_state_dict(torch.load("model.pth",
                                                  map_location=device))
+    if image_inference:
+        # Set before compiling, so that compiled code is not invalidated by changing it later
+        faster_rcnn_model.roi_head.low_score_threshold = model_config['roi_infer_score_threshold']
+    if model_config.get('cuda_graph', False) and device.type == 'cuda':
+        # Replay backbone kernels from a recorded graph, shapes not seen
+        # before get their own graph and rest of the model stays eager
+        faster_rcnn_model.backbone = CUDAGraphModule(faster_rcnn_model.backbone)
+    if model_config.get('compile', False):
+        # Fuse kernels with torch.compile, data dependent parts (nms, filtering)
+        # fall back to eager through graph breaks. Image size varies with aspect ratio
+        # so compile with dynamic shapes, and no cudagraphs in compile itself as that would
+        # record a graph for every new shape. Graph capture is left to the bounded cuda_graph option
+        faster_rcnn_model = torch.compile(faster_rcnn_model, dynamic=True, fullgraph=False)
+        # Trigger compilation once before the first real image
+        with torch.inference_mode():
+            faster_rcnn_model(torch.rand(1, model_config['im_channels'], model_config['min_im_size'],
+                                         model_config['max_im_size'], device=device), None)
     return faster_rcnn_model, voc, test_dataset
 
 
+@torch.inference_mode()
+def infer_one_image(faster_rcnn_model, voc, image_ndarray, rgb=True):
+    r"""
+    Runs an already loaded model on a single image and draws the predictions on it
+    :param faster_rcnn_model: model from load_model_and_dataset
+    :param voc: dataset from load_model_and_dataset, used for label names
+    :param image_ndarray: (H x W x 3) uint8 image
+    :param rgb: channel order of image_ndarray, RGB if True else BGR (as read by cv2)
+    :return: copy of image_ndarray with predicted boxes drawn, same channel order
+    """
+    if rgb:
+        im_rgb = image_ndarray
+        box_color = [255, 0, 0]
+    else:
+        im_rgb = cv2.cvtColor(image_ndarray, cv2.COLOR_BGR2RGB)
+        box_color = [0, 0, 255]
+    
+    im_tensor = torch.from_numpy(im_rgb).permute(2, 0, 1).unsqueeze(0).float() / 255.0
+    im_tensor = im_tensor.to(device)
+
+    rpn_output, frcnn_output = faster_rcnn_model(im_tensor, None)
+    boxes = frcnn_output['boxes']
+    labels = frcnn_output['labels']
+    scores = frcnn_output['scores']
+
+    im_copy = image_ndarray.copy()
+
+    # One transfer for all predictions instead of a sync per box
+    boxes_np = boxes.detach().cpu().numpy().astype(int)
+    labels_list = labels.detach().cpu().tolist()
+    scores_list = scores.detach().cpu().tolist()
+    for (x1, y1, x2, y2), label, score in zip(boxes_np, labels_list, scores_list):
+        label_name = voc.idx2label[label]
+        text = f'{label_name} : {score:.2f}'
+
+        cv2.rectangle(im_copy, (x1, y1), (x2, y2), thickness=2, color=box_color)
+        text_w, text_h = get_text_size(text)
+        cv2.rectangle(im_copy , (x1, y1), (x1 + 10 + text_w, y1 + 10 + text_h), (255, 255, 255), -1)
+        cv2.putText(im_copy, text, (x1 + 5, y1 + 15), cv2.FONT_HERSHEY_PLAIN, 1, (0, 0, 0), 1)
+    return im_copy
+
+
+@torch.inference_mode()
 def infer(args):
     if not os.path.exists('samples'):
         os.mkdir('samples')
 
-    faster_rcnn_model, voc, test_dataset = load_model_and_dataset(args)
-    
-    # Hard coding the low score threshold for inference on images for now
-    # Should come from config
-    faster_rcnn_model.roi_head.low_score_threshold = 0.6
+    # Uses the higher low score threshold for inference on images
+    faster_rcnn_model, voc, test_dataset = load_model_and_dataset(args, image_inference=True)
     
 
+    # For in memory images use infer_one_image with an already loaded model,
+    # infer loads the model on every call
     if args.path != 'NULL' and os.path.isfile(args.path):
         # Single image inference from path
         image_path = args.path
@@ -203,63 +305,41 @@ def infer(args):
         if im_np is None:
             print(f"Error: Could not read image {image_path}")
             return None
-        
-        im_rgb = cv2.cvtColor(im_np, cv2.COLOR_BGR2RGB)
-        im_tensor = torch.from_numpy(im_rgb).permute(2, 0, 1).unsqueeze(0).float() / 255.0
-        im_tensor = im_tensor.to(device)
-
-        rpn_output, frcnn_output = faster_rcnn_model(im_tensor, None)
-        boxes = frcnn_output['boxes']
-        labels = frcnn_output['labels']
-        scores = frcnn_output['scores']
-
-        im_copy = im_np.copy()
-
-        for idx, box in enumerate(boxes):
-            x1, y1, x2, y2 = box.detach().cpu().numpy()
-            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-            label_name = voc.idx2label[labels[idx].detach().cpu().item()]
-            score = scores[idx].detach().cpu().item()
-            text = f'{label_name} : {score:.2f}'
-
-            cv2.rectangle(im_copy, (x1, y1), (x2, y2), thickness=2, color=[0, 0, 255])
-            text_size, _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_PLAIN, 1, 1)
-            text_w, text_h = text_size
-            cv2.rectangle(im_copy , (x1, y1), (x1 + 10 + text_w, y1 + 10 + text_h), (255, 255, 255), -1)
-            cv2.putText(im_copy, text, (x1 + 5, y1 + 15), cv2.FONT_HERSHEY_PLAIN, 1, (0, 0, 0), 1)
+        im_copy = infer_one_image(faster_rcnn_model, voc, im_np, rgb=False)
 
         output_path = os.path.join('samples', 'output_single_image.jpg')
-        cv2.imwrite(output_path, im_copy)
+        cv2.imwrite(output_path, im_copy, jpeg_write_params)
         print(f"Inference done for single image. Saved to {output_path}")
-        return output_path
+        return im_copy
     else:
-        for sample_count in tqdm(range(10)):
-            random_idx = random.randint(0, len(voc))
-            im, target, fname = voc[random_idx]
-            im = im.unsqueeze(0).float().to(device)
-
+        # Load the random samples in worker processes, so the next sample
+        # is decoded while the current one goes through the model
+        sample_indices = random.sample(range(len(voc)), min(10, len(voc)))
+        num_workers = min(4, (os.cpu_count() or 0) // 2)
+        sample_loader = DataLoader(Subset(voc, sample_indices), batch_size=1, shuffle=False,
+                                   collate_fn=collate_fn, num_workers=num_workers,
+                                   pin_memory=device.type == 'cuda')
+        for sample_count, (ims, targets, fnames) in enumerate(tqdm(sample_loader)):
+            im, target, fname = ims[0], targets[0], fnames[0]
 # Convert to numpy for OpenCV
-            im_np = im.squeeze(0).permute(1, 2, 0).detach().cpu().numpy()
-            im_np = np.ascontiguousarray((im_np * 255).astype(np.uint8))
+            # Dataset already gives a uint8 image on host, take an HWC view of it before moving to device
+            im_hwc = im.permute(1, 2, 0).numpy()
+            im = im.unsqueeze(0).to(device, non_blocking=True).float() / 255.0
+            im_np = im_hwc.copy()
 
-            im_copy = im_np.copy()
+            im_copy = im_hwc.copy()
         
 # Saving images with ground truth boxes
-            for idx, box in enumerate(target['bboxes']):
-                x1, y1, x2, y2 = box.detach().cpu().numpy().astype(int)
-    
-                cv2.rectangle(im_np, (x1, y1), (x2, y2), thickness=2, color=[0, 255, 0])
-                cv2.rectangle(im_copy, (x1, y1), (x2, y2), thickness=2, color=[0, 255, 0])
-                text = voc.idx2label[target['labels'][idx].detach().cpu().item()]
-                text_size, _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_PLAIN, 1, 1)
-                text_w, text_h = text_size
+            gt_boxes_np = target['bboxes'].numpy().astype(int)
+            if len(gt_boxes_np) > 0:
+                gt_polylines = list(get_box_polylines(gt_boxes_np))
+                cv2.polylines(im_np, gt_polylines, isClosed=True, thickness=2, color=[0, 255, 0])
+                cv2.polylines(im_copy, gt_polylines, isClosed=True, thickness=2, color=[0, 255, 0])
+            gt_labels_list = target['labels'].tolist()
+            for (x1, y1, x2, y2), label in zip(gt_boxes_np, gt_labels_list):
+                text = voc.idx2label[label]
+                text_w, text_h = get_text_size(text)
                 cv2.rectangle(im_copy , (x1, y1), (x1 + 10+text_w, y1 + 10+text_h), [255, 255, 255], -1)
-                cv2.putText(im_copy, text=voc.idx2label[target['labels'][idx].detach().cpu().item()],
-                        org=(x1+5, y1+15),
-                        thickness=1,
-                        fontScale=1,
-                        color=[0, 0, 0],
-                        fontFace=cv2.FONT_HERSHEY_PLAIN)
                 cv2.putText(im_copy, text=text,
                         org=(x1 + 5, y1 + 15),
                         thickness=1,
@@ -274,28 +354,21 @@ def infer(args):
             boxes = frcnn_output['boxes']
             labels = frcnn_output['labels']
             scores = frcnn_output['scores']
-            im_np = im.squeeze(0).permute(1, 2, 0).detach().cpu().numpy()
-            im_np = np.ascontiguousarray((im_np * 255).astype(np.uint8))
+            im_np = im_hwc.copy()
 
-            im_copy = im_np.copy()
+            im_copy = im_hwc.copy()
         
         # Saving images with predicted boxes
-            for idx, box in enumerate(boxes):
-                x1, y1, x2, y2 = box.detach().cpu().numpy()
-                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                cv2.rectangle(im_copy, (x1, y1), (x2, y2), thickness=2, color=[0, 0, 255])
-                cv2.rectangle(im_copy, (x1, y1), (x2, y2), thickness=2, color=[0, 0, 255])
-                text = '{} : {:.2f}'.format(voc.idx2label[labels[idx].detach().cpu().item()],
-                                        scores[idx].detach().cpu().item())
-                text_size, _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_PLAIN, 1, 1)
-                text_w, text_h = text_size
+            # One transfer for all predictions instead of a sync per box
+            boxes_np = boxes.detach().cpu().numpy().astype(int)
+            labels_list = labels.detach().cpu().tolist()
+            scores_list = scores.detach().cpu().tolist()
+            if len(boxes_np) > 0:
+                cv2.polylines(im_copy, list(get_box_polylines(boxes_np)), isClosed=True, thickness=2, color=[0, 0, 255])
+            for (x1, y1, x2, y2), label, score in zip(boxes_np, labels_list, scores_list):
+                text = '{} : {:.2f}'.format(voc.idx2label[label], score)
+                text_w, text_h = get_text_size(text)
                 cv2.rectangle(im_copy , (x1, y1), (x1 + 10+text_w, y1 + 10+text_h), [255, 255, 255], -1)
-                cv2.putText(im_copy, text=text,
-                        org=(x1+5, y1+15),
-                        thickness=1,
-                        fontScale=1,
-                        color=[0, 0, 0],
-                        fontFace=cv2.FONT_HERSHEY_PLAIN)
                 cv2.putText(im_copy, text=text,
                         org=(x1 + 5, y1 + 15),
                         thickness=1,
@@ -303,44 +376,48 @@ def infer(args):
                         color=[0, 0, 0],
                         fontFace=cv2.FONT_HERSHEY_PLAIN)
             im_out = cv2.addWeighted(im_copy, 0.7, im_np, 0.3, 0)
-            cv2.imwrite('samples/output_frcnn_{}.jpg'.format(sample_count), im_out)
+            cv2.imwrite('samples/output_frcnn_{}.jpg'.format(sample_count), im_out, jpeg_write_params)
 
 
+@torch.inference_mode()
 def evaluate_map(args):
     faster_rcnn_model, voc, test_dataset = load_model_and_dataset(args)
     gts = []
     preds = []
-    for im, target, fname in tqdm(test_dataset):
-        im_name = fname
-        im = im.float().to(device)
-        target_boxes = target['bboxes'].float().to(device)[0]
-        target_labels = target['labels'].long().to(device)[0]
-        rpn_output, frcnn_output = faster_rcnn_model(im, None)
-
-        boxes = frcnn_output['boxes']
-        labels = frcnn_output['labels']
-        scores = frcnn_output['scores']
-        
-        pred_boxes = {}
-        gt_boxes = {}
-        for label_name in voc.idx2label.values():
-            pred_boxes[label_name] = []
-            gt_boxes[label_name] = []
-        
-        for idx, box in enumerate(boxes):
-            x1, y1, x2, y2 = box.detach().cpu().numpy()
-            label = labels[idx].detach().cpu().item()
-            score = scores[idx].detach().cpu().item()
-            label_name = voc.idx2label[label]
-            pred_boxes[label_name].append([x1, y1, x2, y2, score])
-        for idx, box in enumerate(target_boxes):
-            x1, y1, x2, y2 = box.detach().cpu().numpy()
-            label = target_labels[idx].detach().cpu().item()
-            label_name = voc.idx2label[label]
-            gt_boxes[label_name].append([x1, y1, x2, y2])
-        
-        gts.append(gt_boxes)
-        preds.append(pred_boxes)
+    for ims, targets, fnames in tqdm(test_dataset):
+        # Model RPN and ROI head work on a single image, so the
+        # loaded batch is fed through one image at a time
+        for im, target, fname in zip(ims, targets, fnames):
+            im_name = fname
+            im = im.unsqueeze(0).to(device, non_blocking=True).float() / 255.0
+            # Targets are only needed on cpu for the mAP computation
+            target_boxes = target['bboxes']
+            target_labels = target['labels']
+            rpn_output, frcnn_output = faster_rcnn_model(im, None)
+
+            boxes = frcnn_output['boxes']
+            labels = frcnn_output['labels']
+            scores = frcnn_output['scores']
+            
+            pred_boxes = {}
+            gt_boxes = {}
+            for label_name in voc.idx2label.values():
+                pred_boxes[label_name] = []
+                gt_boxes[label_name] = []
+            
+            # One transfer per image instead of a sync per box
+            boxes_cpu = boxes.detach().cpu().numpy()
+            labels_cpu = labels.detach().cpu().tolist()
+            scores_cpu = scores.detach().cpu().tolist()
+            for (x1, y1, x2, y2), label, score in zip(boxes_cpu, labels_cpu, scores_cpu):
+                label_name = voc.idx2label[label]
+                pred_boxes[label_name].append([x1, y1, x2, y2, score])
+            for (x1, y1, x2, y2), label in zip(target_boxes.numpy(), target_labels.tolist()):
+                label_name = voc.idx2label[label]
+                gt_boxes[label_name].append([x1, y1, x2, y2])
+            
+            gts.append(gt_boxes)
+            preds.append(pred_boxes)
    
     mean_ap, all_aps = compute_map(preds, gts, method='interp')
     print('Class Wise Average Precisions')
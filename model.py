@@ -163,11 +163,7 @@ def transform_boxes_to_original_size(boxes, new_size, original_size):
     :param original_size:
     :return:
     """
-    ratios = [
-        torch.tensor(s_orig, dtype=torch.float32, device=boxes.device)
-        / torch.tensor(s, dtype=torch.float32, device=boxes.device)
-        for s, s_orig in zip(new_size, original_size)
-    ]
+    ratios = [float(s_orig) / float(s) for s, s_orig in zip(new_size, original_size)]
     ratio_height, ratio_width = ratios
     xmin, ymin, xmax, ymax = boxes.unbind(1)
     xmin = xmin * ratio_width
@@ -232,11 +228,12 @@ class RegionProposalNetwork(nn.Module):
         image_h, image_w = image.shape[-2:]
         
         # For the vgg16 case stride would be 16 for both h and w
-        stride_h = torch.tensor(image_h // grid_h, dtype=torch.int64, device=feat.device)
-        stride_w = torch.tensor(image_w // grid_w, dtype=torch.int64, device=feat.device)
+        stride_h = image_h // grid_h
+        stride_w = image_w // grid_w
         
-        scales = torch.as_tensor(self.scales, dtype=feat.dtype, device=feat.device)
-        aspect_ratios = torch.as_tensor(self.aspect_ratios, dtype=feat.dtype, device=feat.device)
+        # Anchors are kept in float32 even if feat is float16 under autocast
+        scales = torch.as_tensor(self.scales, dtype=torch.float32, device=feat.device)
+        aspect_ratios = torch.as_tensor(self.aspect_ratios, dtype=torch.float32, device=feat.device)
         
         # Assuming anchors of scale 128 sq pixels
         # For 1:1 it would be (128, 128) -> area=16384
@@ -741,6 +738,64 @@ class ROIHead(nn.Module):
         return pred_boxes, pred_labels, pred_scores
 
 
+class CUDAGraphModule(nn.Module):
+    r"""
+    Wrapper which records the forward of a module with static shapes
+    (like the vgg16 backbone) into a CUDA graph and replays it on later calls,
+    instead of launching every kernel from python again.
+    One graph is recorded per input shape, up to max_graphs shapes.
+    Inputs of any other shape, non cuda inputs and training mode
+    fall back to the eager forward.
+    Output of a replay is a static buffer. All graphs share one memory pool, so it is
+    overwritten by the next replay of any recorded graph, not only the one for the same shape.
+    """
+    
+    def __init__(self, module, warmup_iters=3, max_graphs=4):
+        super(CUDAGraphModule, self).__init__()
+        self.module = module
+        self.warmup_iters = warmup_iters
+        self.max_graphs = max_graphs
+        # shape -> (graph, static_input, static_output)
+        self.graphs = {}
+        self.pool = None
+    
+    def capture(self, x):
+        static_input = x.clone()
+        
+        # Warmup on a side stream before capture
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(self.warmup_iters):
+                self.module(static_input)
+        torch.cuda.current_stream().wait_stream(stream)
+        
+        graph = torch.cuda.CUDAGraph()
+        # thread_local so that CUDA calls from other threads during capture
+        # (e.g. DataLoader pin memory thread) do not invalidate it
+        with torch.cuda.graph(graph, pool=self.pool, capture_error_mode='thread_local'):
+            static_output = self.module(static_input)
+        # Share memory pool across graphs of different shapes
+        self.pool = graph.pool()
+        return graph, static_input, static_output
+    
+    # Runs eagerly under torch.compile, the graph capture itself can not be traced
+    @torch.compiler.disable
+    def forward(self, x):
+        if self.training or not x.is_cuda:
+            return self.module(x)
+        key = (tuple(x.shape), x.dtype)
+        with torch.no_grad():
+            if key not in self.graphs:
+                if len(self.graphs) >= self.max_graphs:
+                    return self.module(x)
+                self.graphs[key] = self.capture(x)
+            graph, static_input, static_output = self.graphs[key]
+            static_input.copy_(x)
+            graph.replay()
+        return static_output
+
+
 class FasterRCNN(nn.Module):
     def __init__(self, model_config, num_classes):
         super(FasterRCNN, self).__init__()
@@ -759,6 +814,7 @@ class FasterRCNN(nn.Module):
         self.image_std = [0.229, 0.224, 0.225]
         self.min_size = model_config['min_im_size']
         self.max_size = model_config['max_im_size']
+        self.fp16 = model_config.get('fp16', False)
     
     def normalize_resize_image_and_boxes(self, image, bboxes):
         dtype, device = image.dtype, image.device
@@ -791,11 +847,7 @@ class FasterRCNN(nn.Module):
 
         if bboxes is not None:
             # Resize boxes by
-            ratios = [
-                torch.tensor(s, dtype=torch.float32, device=bboxes.device)
-                / torch.tensor(s_orig, dtype=torch.float32, device=bboxes.device)
-                for s, s_orig in zip(image.shape[-2:], (h, w))
-            ]
+            ratios = [float(s) / float(s_orig) for s, s_orig in zip(image.shape[-2:], (h, w))]
             ratio_height, ratio_width = ratios
             xmin, ymin, xmax, ymax = bboxes.unbind(2)
             xmin = xmin * ratio_width
@@ -814,15 +866,21 @@ class FasterRCNN(nn.Module):
         else:
             image, _ = self.normalize_resize_image_and_boxes(image, None)
         
-        # Call backbone
-        feat = self.backbone(image)
-        
-        # Call RPN and get proposals
-        rpn_output = self.rpn(image, feat, target)
-        proposals = rpn_output['proposals']
-        
-        # Call ROI head and convert proposals to boxes
-        frcnn_output = self.roi_head(feat, proposals, image.shape[-2:], target)
+        # Run the network in float16 for gpu inference if enabled,
+        # autocast keeps precision sensitive ops (softmax, roi pool, nms) in float32.
+        # Weight cast cache is disabled so that the backbone can be recorded in a CUDA graph
+        use_fp16 = self.fp16 and not self.training and image.is_cuda
+        with torch.autocast(device_type=image.device.type, dtype=torch.float16,
+                            enabled=use_fp16, cache_enabled=False):
+            # Call backbone
+            feat = self.backbone(image)
+            
+            # Call RPN and get proposals
+            rpn_output = self.rpn(image, feat, target)
+            proposals = rpn_output['proposals']
+            
+            # Call ROI head and convert proposals to boxes
+            frcnn_output = self.roi_head(feat, proposals, image.shape[-2:], target)
         if not self.training:
             # Transform boxes to original image dimensions called only during inference
             frcnn_output['boxes'] = transform_boxes_to_original_size(frcnn_output['boxes'],